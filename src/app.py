@@ -6,7 +6,8 @@ import json
 from json import JSONDecodeError
 import time
 import plotly.graph_objects as go
-from detector import detect_patterns, calculate_severity_and_tier
+from detector import calculate_severity_and_tier
+from scan_pool import ScanPool, ScanPoolError, install_pool
 import os
 
 # Set page config for better appearance
@@ -51,6 +52,12 @@ local_css("styles.css")  # You'll need to create this file
 
 
 
+# One worker pool shared by every session on this server
+@st.cache_resource
+def get_scan_pool():
+    return install_pool(ScanPool())
+
+
 # Create a gauge meter for severity
 # Create a gauge meter for privilege risk
 def create_gauge(severity):
@@ -267,7 +274,11 @@ def main():
     
     script = user_input()
     if script:
-        matches, found_types = detect_patterns(script)
+        try:
+            matches, found_types = get_scan_pool().scan(script)
+        except ScanPoolError as e:
+            st.warning(str(e))
+            return
         severity, tier = calculate_severity_and_tier(found_types)
         display_results(matches, severity, tier)
         
@@ -0,0 +1,236 @@
+#scan_pool.py module
+import os
+import time
+import weakref
+import threading
+import multiprocessing
+from collections import deque
+from contextlib import contextmanager
+from concurrent.futures import CancelledError, ProcessPoolExecutor, TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import shared_memory
+from detector import detect_patterns
+
+# Scripts smaller than this are scanned inline in the session's own thread,
+# so quick pastes never wait behind a large upload from another user.
+SMALL_INPUT_BYTES = 64 * 1024
+
+# Worker processes shared by every Streamlit session
+MAX_WORKERS = max(1, min(4, (os.cpu_count() or 1) - 1))
+
+# Scans allowed to be running or queued at once; more are turned away
+MAX_PENDING = MAX_WORKERS * 2
+
+# Seconds a worker may spend on one scan before it is killed
+RESULT_TIMEOUT = 60.0
+
+# Seconds a queued scan waits for a free worker before being turned away.
+# Multi-MB scripts take seconds to scan, so a queued scan is allowed to wait
+# as long as the scan ahead of it may run; overload is shed by MAX_PENDING.
+QUEUE_TIMEOUT = RESULT_TIMEOUT
+
+
+class ScanPoolError(Exception):
+    """Raised when a scan could not be completed by the pool"""
+
+
+class ScanPoolBusy(ScanPoolError):
+    """Raised when the pool has no free slot for a new scan"""
+
+
+def _scan_shared(name, size):
+    """Worker entry point: read the script from shared memory and scan it"""
+    try:
+        shm = shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:  # Python < 3.13 has no track argument
+        shm = shared_memory.SharedMemory(name=name)
+    try:
+        script = bytes(shm.buf[:size]).decode("utf-8")
+    finally:
+        shm.close()
+    return detect_patterns(script)
+
+
+def _terminate_workers(executor):
+    """Shut an executor down and kill any worker still busy in it"""
+    terminate = getattr(executor, "terminate_workers", None)  # Python 3.14+
+    if terminate is not None:
+        terminate()
+        return
+    processes = list((executor._processes or {}).values())
+    executor.shutdown(wait=False, cancel_futures=True)
+    for process in processes:
+        process.terminate()
+
+
+class ScanPool:
+    """Bounded process pool shared by all sessions of the Streamlit server.
+
+    Large scans wait in a single FIFO queue. Fairness is per browser
+    session: a session's script thread blocks on its own scan, so each
+    session holds at most one place in the line and cannot jump ahead of
+    others by re-uploading. At most ``max_pending`` scans may be running or
+    queued; beyond that ``scan`` raises ``ScanPoolBusy`` at once, and a
+    queued scan that has not started within ``queue_timeout`` seconds
+    raises it too.
+
+    A crashed worker pool is rebuilt and the scan retried once; a scan that
+    crashes twice or runs past ``result_timeout`` raises ``ScanPoolError``.
+    Stopping a scan that timed out kills every worker in the pool, so the
+    other scans running beside it are restarted on the new pool. Those
+    restarts are free: they do not use up the scan's one retry, but they do
+    start its work, and its own ``result_timeout``, over again.
+    """
+
+    def __init__(self, max_workers=MAX_WORKERS, max_pending=MAX_PENDING,
+                 small_input_bytes=SMALL_INPUT_BYTES, queue_timeout=QUEUE_TIMEOUT,
+                 result_timeout=RESULT_TIMEOUT, worker=_scan_shared):
+        self._max_workers = max_workers
+        self._worker = worker
+        self._executor = self._new_executor()
+        self._executor_lock = threading.Lock()
+        # Executors killed to stop a timed-out scan, not by a crash
+        self._stopped = weakref.WeakSet()
+        self._closed = False
+        self._max_pending = max_pending
+        self._cond = threading.Condition()
+        self._running = 0
+        self._waiting = deque()
+        self.small_input_bytes = small_input_bytes
+        self.queue_timeout = queue_timeout
+        self.result_timeout = result_timeout
+
+    def _new_executor(self):
+        # spawn avoids forking the multithreaded Streamlit server process
+        return ProcessPoolExecutor(
+            max_workers=self._max_workers,
+            mp_context=multiprocessing.get_context("spawn")
+        )
+
+    def _replace_executor(self, failed, stopped=False):
+        """Swap in a fresh executor, unless another scan already replaced it"""
+        with self._executor_lock:
+            if stopped:
+                self._stopped.add(failed)
+            if self._closed or self._executor is not failed:
+                return
+            self._executor = self._new_executor()
+        _terminate_workers(failed)
+
+    def _dispatch(self):
+        """Grant free worker slots to waiting scans in arrival order"""
+        while self._running < self._max_workers and self._waiting:
+            ticket = self._waiting.popleft()
+            ticket["granted"] = True
+            self._running += 1
+        self._cond.notify_all()
+
+    @contextmanager
+    def _slot(self):
+        """Wait for a turn at a worker, then hold it for the block"""
+        deadline = time.monotonic() + self.queue_timeout
+        ticket = {"granted": False}
+        with self._cond:
+            if self._running + len(self._waiting) >= self._max_pending:
+                raise ScanPoolBusy("The analysis server is busy, please try again shortly")
+            self._waiting.append(ticket)
+            self._dispatch()
+            while not ticket["granted"]:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._waiting.remove(ticket)
+                    raise ScanPoolBusy("The analysis server is busy, please try again shortly")
+                self._cond.wait(remaining)
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._running -= 1
+                self._dispatch()
+
+    def scan(self, script):
+        """Scan a script, returning the same ``(matches, found_types)`` as detect_patterns"""
+        data = script.encode("utf-8")
+        if len(data) < self.small_input_bytes:
+            return detect_patterns(script)
+
+        with self._slot():
+            return self._run_shared(data)
+
+    def _run_shared(self, data):
+        """Hand a large script to a worker through shared memory instead of pickling it"""
+        shm = shared_memory.SharedMemory(create=True, size=len(data))
+        try:
+            shm.buf[:len(data)] = data
+            crashes = 0
+            while True:
+                executor = None
+                try:
+                    # Hold the lock so the executor cannot be swapped out
+                    # between choosing it and submitting to it
+                    with self._executor_lock:
+                        if self._closed:
+                            raise ScanPoolError("The analysis server is shutting down")
+                        executor = self._executor
+                        future = executor.submit(self._worker, shm.name, len(data))
+                    return future.result(timeout=self.result_timeout)
+                except ScanPoolError:
+                    raise
+                except FutureTimeout:
+                    self._replace_executor(executor, stopped=True)
+                    raise ScanPoolError("The scan took too long and was stopped")
+                except (RuntimeError, CancelledError) as e:
+                    # BrokenProcessPool is a RuntimeError; so is the error for
+                    # submitting to, or being cancelled by, a replaced executor
+                    if self._closed:
+                        raise ScanPoolError("The analysis server is shutting down") from e
+                    if executor in self._stopped:
+                        continue
+                    if not isinstance(e, BrokenProcessPool) and executor is self._executor:
+                        raise ScanPoolError("The scan failed") from e
+                    crashes += 1
+                    self._replace_executor(executor)
+                    if crashes == 2:
+                        raise ScanPoolError("The analysis worker crashed, please try again") from e
+                except Exception as e:
+                    raise ScanPoolError("The scan failed") from e
+        finally:
+            shm.close()
+            shm.unlink()
+
+    def shutdown(self):
+        """Kill the worker processes, including any in the middle of a scan"""
+        with self._executor_lock:
+            if self._closed:
+                return
+            self._closed = True
+        _terminate_workers(self._executor)
+
+
+_shared_pool = None
+_shared_pool_lock = threading.Lock()
+
+
+def install_pool(pool):
+    """Make ``pool`` the server-wide pool and shut down the one it replaces.
+
+    Clearing Streamlit's resource cache builds a new pool; without this the
+    old pool's workers would live until the server exits.
+    """
+    global _shared_pool
+    with _shared_pool_lock:
+        previous, _shared_pool = _shared_pool, pool
+    if previous is not None:
+        previous.shutdown()
+    return pool
+
+
+def _shutdown_shared_pool():
+    if _shared_pool is not None:
+        _shared_pool.shutdown()
+
+
+# A plain atexit hook runs only after concurrent.futures has joined its
+# manager threads, i.e. after any running scan finishes. Hooks registered
+# here run in reverse order, so this one kills the workers first.
+threading._register_atexit(_shutdown_shared_pool)
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The app imports its modules flat, the way `streamlit run src/app.py` sees them
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
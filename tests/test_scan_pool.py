@@ -0,0 +1,210 @@
+import os
+import threading
+import time
+from multiprocessing import shared_memory
+
+import pytest
+
+from detector import detect_patterns
+from scan_pool import ScanPool, ScanPoolBusy, ScanPoolError
+
+SMALL_SCRIPT = "sudo ls /root\n"
+LARGE_SCRIPT = "echo hi\nchmod 777 x\n" * 100 + "rm -rf /tmp/x\n"
+SharedMemory = shared_memory.SharedMemory
+
+
+def scripted_worker(name, size):
+    """Worker whose script is a command: ``sleep SECONDS``, ``exit``, or
+    ``attempts LOGFILE SECONDS``, which hangs on its first run, crashes on
+    its second and succeeds on its third.
+    """
+    shm = SharedMemory(name=name)
+    try:
+        command = bytes(shm.buf[:size]).decode("utf-8").split()
+    finally:
+        shm.close()
+    if command[0] == "sleep":
+        time.sleep(float(command[1]))
+    elif command[0] == "exit":
+        os._exit(1)
+    elif command[0] == "attempts":
+        with open(command[1], "a") as log:
+            log.write("run\n")
+        with open(command[1]) as log:
+            runs = len(log.readlines())
+        if runs == 1:
+            time.sleep(float(command[2]))
+        elif runs == 2:
+            os._exit(1)
+    return "ok"
+
+
+def scripted_pool(**kwargs):
+    return ScanPool(small_input_bytes=0, worker=scripted_worker, **kwargs)
+
+
+@pytest.fixture
+def pool():
+    pool = ScanPool(max_workers=1, max_pending=4, small_input_bytes=1024)
+    yield pool
+    pool.shutdown()
+
+
+@pytest.fixture
+def created_segments(monkeypatch):
+    names = []
+
+    class RecordingSharedMemory(SharedMemory):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            names.append(self.name)
+
+    monkeypatch.setattr(shared_memory, "SharedMemory", RecordingSharedMemory)
+    return names
+
+
+def assert_unlinked(names):
+    assert names
+    for name in names:
+        with pytest.raises(FileNotFoundError):
+            SharedMemory(name=name)
+
+
+def test_inline_scan_matches_detect_patterns(pool, created_segments):
+    assert pool.scan(SMALL_SCRIPT) == detect_patterns(SMALL_SCRIPT)
+    assert created_segments == []
+
+
+def test_shared_memory_scan_matches_detect_patterns(pool, created_segments):
+    assert pool.scan(LARGE_SCRIPT) == detect_patterns(LARGE_SCRIPT)
+    assert_unlinked(created_segments)
+
+
+def test_segment_unlinked_when_worker_raises(pool, created_segments):
+    with pytest.raises(ScanPoolError):
+        pool._run_shared(b"\xff" * 2048)
+    assert_unlinked(created_segments)
+
+
+def test_busy_when_max_pending_exhausted():
+    pool = ScanPool(max_workers=1, max_pending=1, small_input_bytes=1024)
+    try:
+        with pool._slot():
+            with pytest.raises(ScanPoolBusy):
+                pool.scan(LARGE_SCRIPT)
+    finally:
+        pool.shutdown()
+
+
+def test_queued_scan_times_out():
+    pool = ScanPool(max_workers=1, max_pending=4, queue_timeout=0.1)
+    try:
+        with pool._slot():
+            with pytest.raises(ScanPoolBusy):
+                with pool._slot():
+                    pass
+        assert not pool._waiting
+    finally:
+        pool.shutdown()
+
+
+def test_slots_are_granted_in_arrival_order(pool):
+    order = []
+
+    def wait_for_slot(label):
+        with pool._slot():
+            order.append(label)
+
+    threads = []
+    with pool._slot():
+        for label in ["first", "second", "third"]:
+            thread = threading.Thread(target=wait_for_slot, args=(label,))
+            thread.start()
+            threads.append(thread)
+            while len(pool._waiting) < len(threads):
+                time.sleep(0.01)
+    for thread in threads:
+        thread.join()
+
+    assert order == ["first", "second", "third"]
+
+
+def test_pool_recovers_after_worker_crash():
+    pool = scripted_pool(max_workers=1)
+    try:
+        with pytest.raises(ScanPoolError, match="crashed"):
+            pool.scan("exit")
+        assert pool.scan("sleep 0") == "ok"
+    finally:
+        pool.shutdown()
+
+
+def test_crash_is_retried_once(tmp_path):
+    log = tmp_path / "attempts.log"
+    log.write_text("run\n")  # skip the hanging first run
+    pool = scripted_pool(max_workers=1)
+    try:
+        assert pool.scan(f"attempts {log} 0") == "ok"
+        assert len(log.read_text().splitlines()) == 3
+    finally:
+        pool.shutdown()
+
+
+def test_scan_times_out_and_pool_recovers():
+    pool = scripted_pool(max_workers=1, result_timeout=0.5)
+    try:
+        started = time.monotonic()
+        with pytest.raises(ScanPoolError, match="too long"):
+            pool.scan("sleep 30")
+        assert time.monotonic() - started < 10
+        assert pool.scan("sleep 0") == "ok"
+    finally:
+        pool.shutdown()
+
+
+def test_restart_after_another_scans_timeout_does_not_use_the_retry(tmp_path):
+    log = tmp_path / "attempts.log"
+    pool = scripted_pool(max_workers=2, max_pending=2, result_timeout=3)
+    results = {}
+
+    def run(label, script):
+        try:
+            results[label] = pool.scan(script)
+        except ScanPoolError as e:
+            results[label] = e
+
+    try:
+        hog = threading.Thread(target=run, args=("hog", "sleep 30"))
+        hog.start()
+        time.sleep(1)
+        # Killed by the hog's timeout, then crashes on its own once
+        innocent = threading.Thread(target=run, args=("innocent", f"attempts {log} 30"))
+        innocent.start()
+        hog.join()
+        innocent.join()
+    finally:
+        pool.shutdown()
+
+    assert isinstance(results["hog"], ScanPoolError)
+    assert results["innocent"] == "ok"
+    assert len(log.read_text().splitlines()) == 3
+
+
+def test_shutdown_stops_a_running_scan():
+    pool = scripted_pool(max_workers=1)
+    errors = []
+
+    def run():
+        try:
+            pool.scan("sleep 30")
+        except ScanPoolError as e:
+            errors.append(e)
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    time.sleep(1)
+    pool.shutdown()
+    thread.join(10)
+
+    assert not thread.is_alive()
+    assert "shutting down" in str(errors[0])